@@ -4,63 +4,118 @@ Scans the Lyrics folder, extracts text from .odt/.doc/.docx files using textutil
 and generates songs.js with structured song data for the Song Printer HTML app.
 """
 
+import html
 import json
 import os
 import re
 import subprocess
 import sys
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+
+try:
+    import orjson  # optional: much faster JSON serializer
+except ImportError:
+    orjson = None
 
 LYRICS_DIR = "/Users/johnhobbs/Desktop/Church/Lyrics"
 OUTPUT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "songs.js")
+# Parsed results from the last build, keyed by filename, so unchanged files
+# are not reconverted
+CACHE_FILE = OUTPUT_FILE + ".cache.json"
+
+# Files per textutil invocation (amortizes process startup across the batch)
+CHUNK_SIZE = 25
+
+# Chord tokens are tiny and regular (root, optional accidental, optional
+# quality, optional slash bass), so they are checked with plain string ops
+# rather than a regex match per token
+CHORD_ROOTS = frozenset('ABCDEFG')
+CHORD_QUALITIES = frozenset(('', 'm', 'maj', 'min', 'dim', 'aug', 'sus', 'sus2', 'sus4', 'bar'))
+
+# Alternate barre notation: "G bar" (collapsed to "Gbar" before tokenizing)
+BAR_RE = re.compile(r'\b([A-G][#b]?)\s+bar\b')
+
+DATE_HEADER_RE = re.compile(r'^\s*Sunday\b', re.IGNORECASE)
+
+# Text-bearing parts of word/document.xml: text runs, tab characters (tab stop
+# definitions carry attributes, so they don't match), breaks, paragraph ends
+DOCX_TEXT_RE = re.compile(r'<w:t(?:\s[^>]*)?>([^<]*)</w:t>|<w:tab/>|<w:(?:br|cr)\b[^>]*>|</w:p>')
 
-CHORD_TOKEN_RE = re.compile(
-    r'^[A-G][#b]?(m|maj|min|dim|aug|sus[24]?|add\d+|\d+|bar)?(\/[A-G][#b]?)?$'
-)
+# Any tag in an .odt content.xml; <text:s text:c="N"/> is a run of N spaces
+ODT_TAG_RE = re.compile(r'<text:s(?:\s+text:c="(\d+)")?\s*/>|(<[^>]*>)')
 
+def is_chord_quality(quality):
+    return (quality in CHORD_QUALITIES or quality.isdecimal() or
+            (quality.startswith('add') and quality[3:].isdecimal()))
+
+def is_chord_token(token):
+    """Check if a token is a chord like C, F#m, Gsus4, Cadd9, Bbar or D/F#."""
+    if not token or token[0] not in CHORD_ROOTS:
+        return False
+    slash = token.find('/')
+    if slash == -1:
+        body = token[1:]
+    else:
+        bass = token[slash + 1:]
+        if not (1 <= len(bass) <= 2 and bass[0] in CHORD_ROOTS and bass[1:] in ('', '#', 'b')):
+            return False
+        body = token[1:slash]
+    if is_chord_quality(body):
+        return True
+    # "Bbar" is B + bar, but "Bbm" is Bb + m, so try the accidental both ways
+    return body[:1] in ('#', 'b') and is_chord_quality(body[1:])
+
+# Lyrics repeat lines (choruses, blanks), so cache the per-line verdict
+@lru_cache(maxsize=4096)
 def is_chord_line(line):
     trimmed = line.strip()
     if not trimmed:
         return False
     # Collapse "X bar" into "Xbar" before tokenizing (alternate chord notation)
-    collapsed = re.sub(r'\b([A-G][#b]?)\s+bar\b', r'\1bar', trimmed)
+    collapsed = BAR_RE.sub(r'\1bar', trimmed)
     tokens = collapsed.split()
-    chord_count = sum(1 for t in tokens if CHORD_TOKEN_RE.match(t))
+    chord_count = sum(1 for t in tokens if is_chord_token(t))
     return chord_count > 0 and chord_count >= len(tokens) * 0.6
 
 def is_chord_file(lines):
-    non_empty = [l for l in lines if l.strip()]
-    if not non_empty:
+    # Stripped once at C level; is_chord_line strips anyway, and stripped keys
+    # share its cache across differently indented copies of a line
+    non_empty = list(filter(None, map(str.strip, lines)))
+    total = len(non_empty)
+    if not total:
         return False
-    chord_lines = sum(1 for l in non_empty if is_chord_line(l))
-    return chord_lines / len(non_empty) > 0.15
+    # Stop as soon as the >15% threshold is decided either way
+    chord_lines = 0
+    for seen, l in enumerate(non_empty, 1):
+        if is_chord_line(l):
+            chord_lines += 1
+            if chord_lines / total > 0.15:
+                return True
+        elif (chord_lines + total - seen) / total <= 0.15:
+            return False
+    return False
 
 def is_date_header(line):
-    return bool(re.match(r'^\s*Sunday\b', line, re.IGNORECASE))
+    return bool(DATE_HEADER_RE.match(line))
 
 def clean_filename(filename):
-    name = re.sub(r'\.(odt|docx?|pages)$', '', filename, flags=re.IGNORECASE)
-    name = re.sub(r'[-_]+', ' ', name)
-    name = re.sub(r'\s+', ' ', name).strip()
+    stem, dot, ext = filename.rpartition('.')
+    name = stem if dot and ext.lower() in ('odt', 'doc', 'docx', 'pages') else filename
+    name = name.replace('-', ' ').replace('_', ' ')
+    name = ' '.join(name.split())
     return name
 
-def extract_title(lines, filename):
-    for line in lines:
-        trimmed = line.strip()
-        if not trimmed:
-            continue
-        if is_date_header(line):
-            continue
-        if 0 < len(trimmed) < 80:
-            return trimmed
-        break
-    return clean_filename(filename)
-
 def normalize_line_breaks(text):
     """Replace Unicode line separators and paragraph separators with newlines."""
     text = text.replace('\u2028', '\n')  # Line Separator
     text = text.replace('\u2029', '\n')  # Paragraph Separator
-    text = text.replace('\r\n', '\n')
-    text = text.replace('\r', '\n')
+    # Separators are mapped first so "\r\u2028" still collapses to one newline
+    if '\r' in text:
+        text = text.replace('\r\n', '\n')
+        text = text.replace('\r', '\n')
     return text
 
 def parse_song(text, filename):
@@ -70,121 +125,280 @@ def parse_song(text, filename):
     if is_chord_file(raw_lines):
         return None
 
-    # Strip date headers and leading blank lines
-    start_idx = 0
-    for i, line in enumerate(raw_lines):
-        trimmed = line.strip()
-        if not trimmed:
-            start_idx = i + 1
-            continue
-        if is_date_header(line):
-            start_idx = i + 1
-            continue
-        break
-
-    content_lines = raw_lines[start_idx:]
-
-    title = extract_title(content_lines, filename)
-
-    # Skip the title line in body
-    body_start = 0
-    for i, line in enumerate(content_lines):
-        trimmed = line.strip()
-        if not trimmed:
-            body_start = i + 1
-            continue
-        if trimmed == title:
-            body_start = i + 1
-            break
-        break
-
-    body_lines = content_lines[body_start:]
+    # Single forward pass: skip date headers and blank lines, take the first
+    # remaining line as the title, then parse everything after it as body
+    title = None
     parsed = []
 
-    for line in body_lines:
-        indent = 0
-        j = 0
+    for line in raw_lines:
+        if title is None:
+            trimmed = line.strip()
+            if not trimmed or is_date_header(line):
+                continue
+            title = trimmed if len(trimmed) < 80 else clean_filename(filename)
+            if trimmed == title:
+                continue
+
         # Count leading tabs
-        while j < len(line) and line[j] == '\t':
-            indent += 1
-            j += 1
+        indent = len(line) - len(line.lstrip('\t'))
         # If no tabs, check for leading spaces
         if indent == 0:
-            spaces = 0
-            while j < len(line) and line[j] == ' ':
-                spaces += 1
-                j += 1
+            spaces = len(line) - len(line.lstrip(' '))
             if spaces >= 8:
                 indent = 2
             elif spaces >= 4:
                 indent = 1
 
-        text_content = line.strip()
+        # Interned so repeated lines (choruses) share one string object
+        text_content = sys.intern(line.strip())
 
         # Skip bracket-only labels like [bridge]
-        if re.match(r'^\[.*\]$', text_content):
+        if text_content.startswith('[') and text_content.endswith(']'):
             continue
 
-        parsed.append({"indent": indent, "text": text_content})
+        # Leading empty lines are never appended; trailing ones are trimmed below
+        if not text_content and not parsed:
+            continue
+
+        parsed.append((indent, text_content))
+
+    if title is None:
+        title = clean_filename(filename)
 
-    # Trim leading and trailing empty lines
-    while parsed and parsed[0]["text"] == "":
-        parsed.pop(0)
-    while parsed and parsed[-1]["text"] == "":
+    while parsed and parsed[-1][1] == "":
         parsed.pop()
 
     return {"title": title, "lines": parsed}
 
+def song_to_json(song):
+    """Expand a parsed song's (indent, text) line tuples into the
+    {indent, text} objects that songs.js uses."""
+    return {
+        "title": song["title"],
+        "lines": [{"indent": indent, "text": text} for indent, text in song["lines"]],
+    }
+
+def read_docx_lines(filepath):
+    """Pull the paragraph text out of a .docx (word/document.xml) without textutil."""
+    with zipfile.ZipFile(filepath) as z:
+        xml = z.read('word/document.xml').decode('utf-8')
+    parts = []
+    for m in DOCX_TEXT_RE.finditer(xml):
+        if m.group(1) is not None:
+            parts.append(html.unescape(m.group(1)))
+        elif m.group() == '<w:tab/>':
+            parts.append('\t')
+        else:
+            parts.append('\n')
+    return ''.join(parts).split('\n')
+
+def read_odt_lines(filepath):
+    """Pull the paragraph text out of an .odt (content.xml) without textutil."""
+    with zipfile.ZipFile(filepath) as z:
+        xml = z.read('content.xml').decode('utf-8')
+    body = xml[xml.find('<office:body'):]
+
+    def replace(m):
+        tag = m.group(2)
+        if tag is None:
+            return ' ' * int(m.group(1) or 1)
+        if tag == '<text:tab/>':
+            return '\t'
+        if tag in ('<text:line-break/>', '</text:p>', '</text:h>'):
+            return '\n'
+        return ''
+
+    return html.unescape(ODT_TAG_RE.sub(replace, body)).split('\n')
+
+def peek_is_chord_file(filename):
+    """Cheaply check a .docx/.odt for chord content by reading its XML directly,
+    so obvious chord charts skip the textutil conversion. Returns False when
+    unsure (other formats, unreadable archives); textutil then decides."""
+    filepath = os.path.join(LYRICS_DIR, filename)
+    ext = os.path.splitext(filename)[1].lower()
+    try:
+        if ext == '.docx':
+            return is_chord_file(read_docx_lines(filepath))
+        if ext == '.odt':
+            return is_chord_file(read_odt_lines(filepath))
+    except Exception:
+        pass
+    return False
+
+def convert_chunk(filenames):
+    """Convert a batch of files to text with a single textutil process.
+    Returns a list of (text, skip_reason) pairs in input order; one of each
+    pair is None.
+
+    textutil writes each output next to its input, so the files are symlinked
+    into a temp directory under numbered names (avoids "x.doc"/"x.docx" both
+    becoming "x.txt") and converted there in one invocation."""
+    chord_files = {f for f in filenames if peek_is_chord_file(f)}
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        links = []
+        for i, filename in enumerate(filenames):
+            if filename in chord_files:
+                continue
+            link = os.path.join(tmpdir, f"{i}{os.path.splitext(filename)[1]}")
+            os.symlink(os.path.join(LYRICS_DIR, filename), link)
+            links.append(link)
+
+        if links:
+            try:
+                subprocess.run(
+                    ['textutil', '-convert', 'txt'] + links,
+                    capture_output=True, timeout=10 * len(links)
+                )
+            except Exception as e:
+                return [(None, f"{filename} ({e})") for filename in filenames]
+
+        results = []
+        for i, filename in enumerate(filenames):
+            if filename in chord_files:
+                results.append((None, f"{filename} (chord file)"))
+                continue
+            try:
+                # A missing output means textutil failed on this file
+                txt_path = os.path.join(tmpdir, f"{i}.txt")
+                if not os.path.exists(txt_path):
+                    results.append((None, f"{filename} (conversion error)"))
+                    continue
+                # Read raw bytes and decode once; skips TextIOWrapper's
+                # incremental decoding and newline handling
+                with open(txt_path, 'rb') as f:
+                    results.append((f.read().decode('utf-8'), None))
+            except Exception as e:
+                results.append((None, f"{filename} ({e})"))
+        return results
+
+def parse_chunk(filenames, converted):
+    """Parse the output of convert_chunk. Returns a list of (song, skip_reason)
+    pairs in input order; one of each pair is None."""
+    results = []
+    for filename, (text, skip_reason) in zip(filenames, converted):
+        if text is None:
+            results.append((None, skip_reason))
+            continue
+        try:
+            song = parse_song(text, filename)
+            if song:
+                results.append((song, None))
+            else:
+                results.append((None, f"{filename} (chord file)"))
+        except Exception as e:
+            results.append((None, f"{filename} ({e})"))
+    return results
+
+def load_cache():
+    """Load the per-file cache from the previous build. Returns {} if it is
+    missing, unreadable, or was written by a different version of build.py."""
+    if not os.path.exists(CACHE_FILE):
+        return {}
+    try:
+        with open(CACHE_FILE, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        if (cache.get('script_mtime') == os.stat(__file__).st_mtime_ns
+                and isinstance(cache.get('files'), dict)):
+            return cache['files']
+    except Exception as e:
+        print(f"Warning: could not load {CACHE_FILE}: {e}")
+    return {}
+
+def save_cache(files):
+    with open(CACHE_FILE, 'w', encoding='utf-8') as f:
+        json.dump({'script_mtime': os.stat(__file__).st_mtime_ns, 'files': files}, f)
+
 def main():
     extensions = {'.odt', '.doc', '.docx'}
-    files = sorted([
-        f for f in os.listdir(LYRICS_DIR)
-        if os.path.splitext(f)[1].lower() in extensions
-        and not f.startswith('~$')
-        and not re.search(r'chords?', os.path.splitext(f)[0], re.IGNORECASE)
-    ])
-
-    # Also gather chord files that were filtered out, for the skip report
-    chord_name_files = sorted([
-        f for f in os.listdir(LYRICS_DIR)
-        if os.path.splitext(f)[1].lower() in extensions
-        and not f.startswith('~$')
-        and re.search(r'chords?', os.path.splitext(f)[0], re.IGNORECASE)
-    ])
+    # Partition in one pass; chord files (by name) are gathered for the skip report
+    files = []
+    chord_name_files = []
+    for f in os.listdir(LYRICS_DIR):
+        stem, ext = os.path.splitext(f)
+        if ext.lower() not in extensions or f.startswith('~$'):
+            continue
+        # Files with "chord" in the name belong to build_chords.py
+        (chord_name_files if 'chord' in stem.lower() else files).append(f)
+    files.sort()
+    chord_name_files.sort()
 
     print(f"Found {len(files)} lyric files ({len(chord_name_files)} chord files skipped by name)")
 
     songs = []
     skipped = [f"{f} (chord file by name)" for f in chord_name_files]
 
+    # Reuse cached results for files whose mtime and size are unchanged
+    cache = load_cache()
+    new_cache = {}
+    results = {}
+    stamps = {}
+    to_convert = []
     for filename in files:
-        filepath = os.path.join(LYRICS_DIR, filename)
         try:
-            result = subprocess.run(
-                ['textutil', '-convert', 'txt', '-stdout', filepath],
-                capture_output=True, text=True, timeout=10
-            )
-            if result.returncode != 0:
-                skipped.append(f"{filename} (conversion error)")
-                continue
+            st = os.stat(os.path.join(LYRICS_DIR, filename))
+        except OSError as e:
+            # e.g. a dangling symlink, or a file removed since the listing
+            results[filename] = (None, f"{filename} ({e})")
+            continue
+        stamp = [st.st_mtime_ns, st.st_size]
+        entry = cache.get(filename)
+        if isinstance(entry, dict) and entry.get('stamp') == stamp and 'song' in entry:
+            song = entry['song']
+            results[filename] = (song, None if song else f"{filename} (chord file)")
+            new_cache[filename] = entry
+        else:
+            stamps[filename] = stamp
+            to_convert.append(filename)
+
+    if new_cache:
+        print(f"  {len(new_cache)} unchanged files reused from cache")
+
+    # Threads run textutil (waiting on external processes), and each converted
+    # chunk is parsed on the main thread as soon as it is ready, so parsing
+    # overlaps the remaining conversions. Parsing is ~0.03 ms per song, far
+    # less than the ~90 ms it costs to spawn a worker process, so it stays
+    # in-process.
+    chunks = [to_convert[i:i + CHUNK_SIZE] for i in range(0, len(to_convert), CHUNK_SIZE)]
+    max_threads = min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=max_threads) as convert_ex:
+        conversions = {convert_ex.submit(convert_chunk, chunk): chunk for chunk in chunks}
+        for future in as_completed(conversions):
+            chunk = conversions[future]
+            for filename, (song, skip_reason) in zip(chunk, parse_chunk(chunk, future.result())):
+                results[filename] = (song, skip_reason)
+                # Conversion errors are not cached so they are retried next run
+                if song or skip_reason == f"{filename} (chord file)":
+                    new_cache[filename] = {'stamp': stamps[filename], 'song': song}
 
-            song = parse_song(result.stdout, filename)
-            if song:
-                songs.append(song)
-            else:
-                skipped.append(f"{filename} (chord file)")
-        except Exception as e:
-            skipped.append(f"{filename} ({e})")
+    for filename in files:
+        song, skip_reason = results[filename]
+        if song:
+            songs.append(song)
+        else:
+            skipped.append(skip_reason)
+
+    save_cache(new_cache)
 
     songs.sort(key=lambda s: s['title'].lower())
 
     from datetime import datetime
-    output = f"// Auto-generated by build.py — do not edit manually\n"
-    output += f"// Generated: {datetime.now().isoformat()}\n"
-    output += f"const SONGS = {json.dumps(songs, indent=2)};\n"
-
-    with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-        f.write(output)
+    header = (f"// Auto-generated by build.py — do not edit manually\n"
+              f"// Generated: {datetime.now().isoformat()}\n"
+              f"const SONGS = ")
+    songs_out = [song_to_json(s) for s in songs]
+
+    if orjson:
+        with open(OUTPUT_FILE, 'wb') as f:
+            f.write(header.encode('utf-8'))
+            f.write(orjson.dumps(songs_out, option=orjson.OPT_INDENT_2))
+            f.write(b";\n")
+    else:
+        # Stream the JSON straight into the file rather than building one big string
+        with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
+            f.write(header)
+            json.dump(songs_out, f, indent=2)
+            f.write(";\n")
 
     print(f"\nGenerated {OUTPUT_FILE}")
     print(f"  {len(songs)} songs included")
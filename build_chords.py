@@ -16,25 +16,37 @@ import os
 import re
 import subprocess
 import sys
+import tempfile
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 
 LYRICS_DIR = "/Users/johnhobbs/Desktop/Church/Lyrics"
 OUTPUT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chord_songs.js")
+CACHE_FILE = OUTPUT_FILE + ".cache.json"
+
+# Files converted per textutil invocation
+CHUNK_SIZE = 25
 
 # Matches a single chord token like C, Am, G#m7, Dsus4, F#/C#, Eb, Bbar, Am7, Cmaj7, etc.
+# The trailing "bar" (barre chord, e.g. "Bbar", "G7bar") may appear up to twice.
+# Chord and bracket patterns are re.ASCII: \d means 0-9 only, as in the viewer's
+# JavaScript CHORD_RE, and matching skips the Unicode class tables.
 CHORD_TOKEN_RE = re.compile(
-    r'^[A-G][#b]?(m(?:aj)?|min|dim|aug|sus[24]?|add\d+)?\d*(\/(([A-G][#b]?)))?$'
+    r'^[A-G][#b]?(?:m(?:aj)?|min|dim|aug|sus[24]?|add\d+)?\d*(?:/[A-G][#b]?)?(?:bar){0,2}$',
+    re.ASCII
 )
 
 # Section label pattern: [Verse 1], [Chorus], [Bridge], etc.
-SECTION_LABEL_RE = re.compile(r'^\[([^\]]+)\]\s*$')
+SECTION_LABEL_RE = re.compile(r'^\[([^\]]+)\]\s*$', re.ASCII)
 
 # Pattern for section labels that may have extra text after (like [chorus x2])
 SECTION_LABEL_LOOSE_RE = re.compile(r'^\[([^\]]+)\]')
 
 # Unbracketed section labels like "Verse 1", "Chorus", "Bridge", "Intro",
 # "Repeat Chorus", "Final Chorus", "Chorus Repeat", etc.
+# Not re.ASCII: \s must also match the non-breaking spaces Word docs contain.
 UNBRACKETED_SECTION_RE = re.compile(
     r'^(Repeat\s+|Final\s+)?'
     r'(Intro|Verse|Chorus|Bridge|Tag|Outro|Pre[\s-]?Chorus|Interlude|Turn|Instrumental|Ending|Vamp)'
@@ -42,11 +54,66 @@ UNBRACKETED_SECTION_RE = re.compile(
     re.IGNORECASE
 )
 
+# Label keyword -> section type, checked in this order (the first keyword found
+# in the label wins, so "Pre-Chorus" is a chorus and "Verse Intro" a verse)
+SECTION_KEYWORD_TYPES = {
+    'verse': 'verse',
+    'chorus': 'chorus',
+    'bridge': 'bridge',
+    'tag': 'tag',
+    'intro': 'intro',
+    'outro': 'outro',
+    'pre': 'pre-chorus',
+}
+
+# Unbracketed labels are typed by the keyword UNBRACKETED_SECTION_RE matched
+# (group 2, lowercased with spaces and hyphens removed); anything else is a
+# generic section. "Pre-Chorus" counts as a chorus, as it does in brackets.
+UNBRACKETED_KEYWORD_TYPES = {
+    'verse': 'verse',
+    'chorus': 'chorus',
+    'prechorus': 'chorus',
+    'bridge': 'bridge',
+    'tag': 'tag',
+    'intro': 'intro',
+    'outro': 'outro',
+    'ending': 'outro',
+}
+
 # Inline ChordPro bracket pattern: [C], [Am7], [G/B], etc. embedded in lyrics
 INLINE_CHORDPRO_RE = re.compile(
-    r'\[([A-G][#b]?(?:m(?:aj)?|min|dim|aug|sus[24]?|add\d+)?\d*(?:/[A-G][#b]?)?)\]'
+    r'\[([A-G][#b]?(?:m(?:aj)?|min|dim|aug|sus[24]?|add\d+)?\d*(?:/[A-G][#b]?)?)\]',
+    re.ASCII
 )
 
+# Collapses "X bar" / "Xbar" (barre chord notation) down to the chord itself
+BAR_COLLAPSE_RE = re.compile(r'\b([A-G][#b]?(?:m|maj|min|dim|aug|sus[24]?|add\d+|\d+)?)\s*bar\b')
+
+# Narrower "X bar" collapse used for tab-separated inline chords
+BAR_SPACE_RE = re.compile(r'\b([A-G][#b]?)\s+bar\b')
+
+# Cleanups for merged ChordPro lines: "[G]Thee       [C]" -> "[G]Thee [C]",
+# and runs of spaces after a chord marker
+TRAILING_CHORD_GAP_RE = re.compile(r'\s{2,}(\[[^\]]+\])\s*$')
+CHORD_GAP_RE = re.compile(r'(\]) {2,}')
+
+# Space-delimited tokens of a chord or lyric line. Only ' ' separates them
+# (not \s), matching how chord columns are laid out after tab expansion.
+NON_SPACE_RE = re.compile(r'[^ ]+')
+
+# Root note of each inline chord marker, e.g. "F#" from "[F#m7]"
+CHORD_ROOT_RE = re.compile(r'\[([A-G][#b]?)')
+
+DATE_HEADER_RE = re.compile(r'^\s*Sunday\b', re.IGNORECASE)
+
+# Subtitle lines (capo, key, author, date) skipped after the title
+SUBTITLE_PREFIX_RE = re.compile(r'^(capo|key\s|by\s)')
+MONTH_YEAR_RE = re.compile(r'^[A-Z][a-z]+([-\s][A-Z][a-z]+)?\s+\d{4}')
+INITIAL_NAME_RE = re.compile(r'^[A-Z]\.\s')
+TWO_WORD_NAME_RE = re.compile(r'^[A-Z][a-z]+\s+[A-Z][a-z]+$')
+CAPO_SHORTHAND_RE = re.compile(r'^\d+[a-z]?$')
+UPPERCASE_START_RE = re.compile(r'^[A-Z]')
+
 NOTES_SHARP = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
 NOTES_FLAT = ['C', 'Db', 'D', 'Eb', 'E', 'F', 'Gb', 'G', 'Ab', 'A', 'Bb', 'B']
 
@@ -66,15 +133,11 @@ def normalize_line_breaks(text):
     return text
 
 
+@lru_cache(maxsize=4096)
 def is_chord_token(token):
-    """Check if a single whitespace-delimited token is a chord."""
-    # Handle "Xbar" notation (barre chord)
-    if token.endswith('bar') and len(token) > 3:
-        token = token[:-3]
-    # Handle "X7bar" etc.
-    if token.endswith('bar'):
-        token = token[:-3]
-    return bool(CHORD_TOKEN_RE.match(token))
+    """Check if a single whitespace-delimited token is a chord.
+    Cached: songs reuse a handful of chord names thousands of times."""
+    return CHORD_TOKEN_RE.match(token) is not None
 
 
 def is_chord_line(line):
@@ -83,7 +146,7 @@ def is_chord_line(line):
     if not trimmed:
         return False
     # Collapse "X bar" into "Xbar"
-    collapsed = re.sub(r'\b([A-G][#b]?(?:m|maj|min|dim|aug|sus[24]?|add\d+|\d+)?)\s*bar\b', r'\1', trimmed)
+    collapsed = BAR_COLLAPSE_RE.sub(r'\1', trimmed)
     tokens = collapsed.split()
     if not tokens:
         return False
@@ -93,13 +156,15 @@ def is_chord_line(line):
 
 def has_inline_chordpro(line):
     """Check if a line contains inline ChordPro notation like [C]word [G]word."""
-    matches = INLINE_CHORDPRO_RE.findall(line)
-    if len(matches) < 1:
+    m = INLINE_CHORDPRO_RE.search(line)
+    if not m:
         return False
-    # Must also have some non-bracket text (lyrics) to distinguish from section labels
-    stripped = INLINE_CHORDPRO_RE.sub('', line).strip()
     # Allow chord-only lines in ChordPro too (like "[C] [G] [F]")
-    return len(matches) >= 1 and (len(stripped) > 0 or len(matches) >= 2)
+    if INLINE_CHORDPRO_RE.search(line, m.end()):
+        return True
+    # A lone chord must also have some non-bracket text (lyrics) to
+    # distinguish it from section labels
+    return bool(line[:m.start()].strip() or line[m.end():].strip())
 
 
 def is_chord_file(lines):
@@ -115,17 +180,7 @@ def is_chord_file(lines):
 def expand_tabs(line, tab_width=4):
     """Expand tabs to spaces. Uses tab_width=4 which better approximates
     Word's proportional font tab stops than the standard 8."""
-    result = []
-    col = 0
-    for ch in line:
-        if ch == '\t':
-            spaces = tab_width - (col % tab_width)
-            result.append(' ' * spaces)
-            col += spaces
-        else:
-            result.append(ch)
-            col += 1
-    return ''.join(result)
+    return line.expandtabs(tab_width)
 
 
 def extract_chords_with_positions(chord_line):
@@ -134,60 +189,77 @@ def extract_chords_with_positions(chord_line):
     Tabs are expanded first so positions match visual columns."""
     # Expand tabs and collapse "X bar" / "Xbar" notation
     expanded = expand_tabs(chord_line)
-    collapsed = re.sub(r'\b([A-G][#b]?(?:m|maj|min|dim|aug|sus[24]?|add\d+|\d+)?)\s*bar\b', r'\1', expanded)
+    collapsed = BAR_COLLAPSE_RE.sub(r'\1', expanded)
     chords = []
-    i = 0
-    while i < len(collapsed):
-        if collapsed[i] == ' ':
-            i += 1
-            continue
-        # Find the end of this token
-        j = i
-        while j < len(collapsed) and collapsed[j] != ' ':
-            j += 1
-        token = collapsed[i:j]
+    for m in NON_SPACE_RE.finditer(collapsed):
         # Check for period/comma at end (punctuation artifacts)
-        token = token.rstrip('.,;:')
+        token = m.group().rstrip('.,;:')
         if token and is_chord_token(token):
-            chords.append((i, token))
-        i = j
+            chords.append((m.start(), token))
     return chords
 
 
-def snap_to_word_boundary(pos, lyric):
+def tokenize_chord_line(line):
+    """Tokenize a line once for both chord-line detection and chord positions.
+    Returns the (position, chord) list that extract_chords_with_positions would
+    give if is_chord_line(line) is true, else None."""
+    collapsed = BAR_COLLAPSE_RE.sub(r'\1', expand_tabs(line))
+    chords = []
+    token_count = 0
+    chord_count = 0
+    for m in NON_SPACE_RE.finditer(collapsed):
+        piece = m.group()
+        # is_chord_line counts whitespace-split tokens without stripping
+        # punctuation; a space-delimited piece is normally exactly one of them
+        for token in piece.split():
+            token_count += 1
+            if is_chord_token(token):
+                chord_count += 1
+        token = piece.rstrip('.,;:')
+        if token and is_chord_token(token):
+            chords.append((m.start(), token))
+    if chord_count > 0 and chord_count >= token_count * 0.6:
+        return chords
+    return None
+
+
+def word_spans(lyric):
+    """Precompute word boundaries for snapping chords against one lyric line.
+
+    Returns a list parallel to the lyric: for each position inside a word (or
+    just past its end) a (word_start, word_end, next_word) tuple, and None at
+    word starts and in runs of spaces, where a chord is already on a boundary.
+    """
+    n = len(lyric)
+    spans = [None] * n
+    words = [m.span() for m in NON_SPACE_RE.finditer(lyric)]
+    for i, (start, end) in enumerate(words):
+        next_word = words[i + 1][0] if i + 1 < len(words) else n
+        last = min(end, n - 1)
+        spans[start + 1:last + 1] = [(start, end, next_word)] * (last - start)
+    return spans
+
+
+def snap_to_word_boundary(pos, spans):
     """Snap a chord position to the nearest word start in the lyric line.
 
     Word docs and textutil conversion can shift character positions, so we snap
     chords to the nearest word boundary. The algorithm considers both the current
     word start and the next word start, preferring whichever is closer.
+    spans comes from word_spans() so each chord is a constant-time lookup.
     """
-    if pos >= len(lyric):
+    # Past the end, at position 0, or already at a word start: keep it
+    if pos >= len(spans) or spans[pos] is None:
         return pos
 
-    # If we're already at a word start (space before, or position 0), keep it
-    if pos == 0 or lyric[pos - 1] == ' ':
-        return pos
-
-    # We're in the middle of a word. Find the start of this word.
-    word_start = pos
-    while word_start > 0 and lyric[word_start - 1] != ' ':
-        word_start -= 1
-
-    # Also find the start of the next word
-    next_word = pos
-    while next_word < len(lyric) and lyric[next_word] != ' ':
-        next_word += 1
-    while next_word < len(lyric) and lyric[next_word] == ' ':
-        next_word += 1
+    # We're in the middle of a word (or just past its end)
+    word_start, word_end, next_word = spans[pos]
 
     dist_back = pos - word_start
-    dist_fwd = next_word - pos if next_word < len(lyric) else 999
+    dist_fwd = next_word - pos if next_word < len(spans) else 999
 
     # If we're deep into a word (more than half its length past the start),
     # prefer snapping forward to the next word
-    word_end = pos
-    while word_end < len(lyric) and lyric[word_end] != ' ':
-        word_end += 1
     word_len = word_end - word_start
 
     if word_len > 0 and dist_back > word_len * 0.5 and dist_fwd < 999:
@@ -200,12 +272,14 @@ def snap_to_word_boundary(pos, lyric):
         return word_start
 
 
-def merge_chord_and_lyric_lines(chord_line, lyric_line):
+def merge_chord_and_lyric_lines(chord_line, lyric_line, chords=None):
     """Merge a chord line with its corresponding lyric line into ChordPro format.
     Both lines are tab-expanded so chord positions align with lyric characters.
     Chord positions are snapped to the nearest word boundary to compensate for
-    proportional vs monospace font differences."""
-    chords = extract_chords_with_positions(chord_line)
+    proportional vs monospace font differences.
+    Pass chords if the chord line's positions are already known."""
+    if chords is None:
+        chords = extract_chords_with_positions(chord_line)
     if not chords:
         return lyric_line.strip()
 
@@ -215,26 +289,45 @@ def merge_chord_and_lyric_lines(chord_line, lyric_line):
     if len(lyric) <= max_pos:
         lyric = lyric.ljust(max_pos + 1)
 
-    # Snap each chord to nearest word boundary, then insert right-to-left
-    snapped = [(snap_to_word_boundary(pos, lyric), chord) for pos, chord in chords]
+    # Snap each chord to nearest word boundary, then insert right-to-left.
+    # Well-aligned charts put every chord on a word start already; only build
+    # the word spans when some chord actually lands mid-word.
+    if any(pos and lyric[pos - 1] != ' ' for pos, _ in chords):
+        spans = word_spans(lyric)
+        snapped = [(snap_to_word_boundary(pos, spans), chord) for pos, chord in chords]
+    else:
+        snapped = chords
 
     # Deduplicate positions (if two chords snapped to same spot, keep both in order)
-    result = lyric
-    for pos, chord in reversed(snapped):
-        insert_pos = min(pos, len(result))
-        result = result[:insert_pos] + f'[{chord}]' + result[insert_pos:]
+    if all(a[0] <= b[0] for a, b in zip(snapped, snapped[1:])):
+        # Usual case: positions are in order, so build the line in one join
+        parts = []
+        last = 0
+        for pos, chord in snapped:
+            parts.append(lyric[last:pos])
+            parts.append(f'[{chord}]')
+            last = pos
+        parts.append(lyric[last:])
+        result = ''.join(parts)
+    else:
+        # Snapping reordered the chords; splice right-to-left as before so
+        # each insert sees the markers already placed after it
+        result = lyric
+        for pos, chord in reversed(snapped):
+            insert_pos = min(pos, len(result))
+            result = result[:insert_pos] + f'[{chord}]' + result[insert_pos:]
 
     # Clean up: remove excess whitespace before trailing chords
     # e.g. "[G]Thee       [C]" → "[G]Thee [C]"
-    result = re.sub(r'\s{2,}(\[[^\]]+\])\s*$', r' \1', result)
+    result = TRAILING_CHORD_GAP_RE.sub(r' \1', result)
     # Also collapse internal runs of spaces to single space (but keep chord markers)
-    result = re.sub(r'(\]) {2,}', r'] ', result)
+    result = CHORD_GAP_RE.sub(r'] ', result)
 
     return result.strip()
 
 
 def is_date_header(line):
-    return bool(re.match(r'^\s*Sunday\b', line, re.IGNORECASE))
+    return bool(DATE_HEADER_RE.match(line))
 
 
 def clean_filename(filename):
@@ -248,18 +341,22 @@ def clean_filename(filename):
 
 def detect_key(sections):
     """Detect the key from the most common chord root in the song."""
-    root_counts = Counter()
-    for section in sections:
-        for line in section['lines']:
-            for match in re.finditer(r'\[([A-G][#b]?)', line):
-                root = match.group(1)
-                if root in NOTE_TO_INDEX:
-                    root_counts[root] += 1
+    # One findall over the whole song instead of a regex call per line
+    all_text = '\n'.join(line for section in sections for line in section['lines'])
+    root_counts = Counter(r for r in CHORD_ROOT_RE.findall(all_text) if r in NOTE_TO_INDEX)
     if root_counts:
         return root_counts.most_common(1)[0][0]
     return 'C'
 
 
+def section_type(label_lower, keyword_types):
+    """Return the section type of the first keyword (in priority order) found in the label."""
+    for keyword, section in keyword_types.items():
+        if keyword in label_lower:
+            return section
+    return 'section'
+
+
 def parse_section_label(line):
     """If line is a section label like [Verse 1], return (type, label). Else None.
     Also recognizes unbracketed labels like 'Chorus', 'Verse 1', 'Bridge', etc."""
@@ -278,26 +375,14 @@ def parse_section_label(line):
             # Check for unbracketed section labels
             um = UNBRACKETED_SECTION_RE.match(trimmed)
             if um:
-                label = trimmed
-                label_lower = label.lower()
-                if 'verse' in label_lower:
-                    return ('verse', label)
-                elif 'chorus' in label_lower or 'repeat' in label_lower:
-                    return ('chorus', label)
-                elif 'bridge' in label_lower:
-                    return ('bridge', label)
-                elif 'tag' in label_lower:
-                    return ('tag', label)
-                elif 'intro' in label_lower:
-                    return ('intro', label)
-                elif 'outro' in label_lower or 'ending' in label_lower:
-                    return ('outro', label)
-                elif 'pre' in label_lower:
-                    return ('pre-chorus', label)
-                elif 'interlude' in label_lower or 'turn' in label_lower or 'instrumental' in label_lower or 'vamp' in label_lower:
-                    return ('section', label)
-                else:
-                    return ('section', label)
+                keyword = ''.join(um.group(2).lower().split()).replace('-', '')
+                section = UNBRACKETED_KEYWORD_TYPES.get(keyword, 'section')
+                # "Repeat Bridge" / "Tag Repeat": any repeated section but a verse is a chorus
+                repeated = ((um.group(1) or '').lower().startswith('repeat')
+                            or (um.group(5) or '').lower() == 'repeat')
+                if repeated and section != 'verse':
+                    section = 'chorus'
+                return (section, trimmed)
             return None
         # If the bracket content is a chord name, this is inline ChordPro, not a section label
         bracket_content = m.group(1).strip()
@@ -309,24 +394,7 @@ def parse_section_label(line):
             return None
 
     label = m.group(1).strip()
-    label_lower = label.lower()
-
-    if 'verse' in label_lower:
-        return ('verse', label)
-    elif 'chorus' in label_lower:
-        return ('chorus', label)
-    elif 'bridge' in label_lower:
-        return ('bridge', label)
-    elif 'tag' in label_lower:
-        return ('tag', label)
-    elif 'intro' in label_lower:
-        return ('intro', label)
-    elif 'outro' in label_lower:
-        return ('outro', label)
-    elif 'pre' in label_lower:
-        return ('pre-chorus', label)
-    else:
-        return ('section', label)
+    return (section_type(label.lower(), SECTION_KEYWORD_TYPES), label)
 
 
 def parse_chord_file(text, filename):
@@ -378,30 +446,32 @@ def parse_chord_file(text, filename):
     if not title:
         title = clean_filename(filename)
 
-    # Skip title line and any immediate blank lines after it
-    body_lines = lines[title_end:]
-    while body_lines and not body_lines[0].strip():
-        body_lines.pop(0)
+    # Skip title line and any immediate blank lines after it.
+    # Advance an offset and slice once rather than popping from the front.
+    start = title_end
+    while start < len(lines) and not lines[start].strip():
+        start += 1
 
     # Also skip subtitle-ish lines (date, author, capo)
-    while body_lines:
-        trimmed = body_lines[0].strip()
+    while start < len(lines):
+        trimmed = lines[start].strip()
         if not trimmed:
-            body_lines.pop(0)
+            start += 1
             continue
         lower = trimmed.lower()
-        if (re.match(r'^(capo|key\s|by\s)', lower) or
-            re.match(r'^[A-Z][a-z]+([-\s][A-Z][a-z]+)?\s+\d{4}', trimmed) or  # "May 2025", "May-June 2025"
-            re.match(r'^[A-Z]\.\s', trimmed) or  # "J. Hobbs"
-            re.match(r'^[A-Z][a-z]+\s+[A-Z][a-z]+$', trimmed) or  # "John Hobbs" (2-word name)
-            re.match(r'^\d+[a-z]?$', lower) or  # "1c" (capo shorthand)
-            (len(trimmed.split()) <= 4 and not is_chord_line(body_lines[0]) and
+        if (SUBTITLE_PREFIX_RE.match(lower) or
+            MONTH_YEAR_RE.match(trimmed) or  # "May 2025", "May-June 2025"
+            INITIAL_NAME_RE.match(trimmed) or  # "J. Hobbs"
+            TWO_WORD_NAME_RE.match(trimmed) or  # "John Hobbs" (2-word name)
+            CAPO_SHORTHAND_RE.match(lower) or  # "1c" (capo shorthand)
+            (len(trimmed.split()) <= 4 and not is_chord_line(lines[start]) and
              not parse_section_label(trimmed) and
-             re.match(r'^[A-Z]', trimmed) and
+             UPPERCASE_START_RE.match(trimmed) and
              any(c.isdigit() for c in trimmed))):  # date-like short lines
-            body_lines.pop(0)
+            start += 1
             continue
         break
+    body_lines = lines[start:]
 
     # Now parse body into sections
     sections = []
@@ -435,7 +505,8 @@ def parse_chord_file(text, filename):
             continue
 
         # Chord line followed by lyric line
-        if is_chord_line(line):
+        chords = tokenize_chord_line(line)
+        if chords is not None:
             chord_line = line
             # Look ahead for the lyric line
             j = i + 1
@@ -445,12 +516,11 @@ def parse_chord_file(text, filename):
             if j < len(body_lines) and not is_chord_line(body_lines[j]) and not parse_section_label(body_lines[j].strip()):
                 # Merge chord + lyric
                 lyric_line = body_lines[j]
-                merged = merge_chord_and_lyric_lines(chord_line, lyric_line)
+                merged = merge_chord_and_lyric_lines(chord_line, lyric_line, chords)
                 current_section['lines'].append(merged)
                 i = j + 1
             else:
                 # Chord line with no lyric line — chord-only line
-                chords = extract_chords_with_positions(chord_line)
                 if chords:
                     chord_str = ' '.join(f'[{c}]' for _, c in chords)
                     current_section['lines'].append(chord_str)
@@ -522,7 +592,7 @@ def extract_inline_chords(line):
         after_tab = parts[1].strip()
         if before_tab and after_tab:
             # Check if the before-tab part is chords
-            collapsed = re.sub(r'\b([A-G][#b]?)\s+bar\b', r'\1', before_tab)
+            collapsed = BAR_SPACE_RE.sub(r'\1', before_tab)
             tokens = collapsed.split()
             chord_count = sum(1 for t in tokens if is_chord_token(t))
             if tokens and chord_count >= len(tokens) * 0.5:
@@ -543,19 +613,125 @@ def load_existing_songs():
         with open(OUTPUT_FILE, 'r', encoding='utf-8') as f:
             content = f.read()
         # Extract the JSON array from "const CHORD_SONGS = [...];"
-        match = re.search(r'const CHORD_SONGS\s*=\s*(\[.*\])\s*;', content, re.DOTALL)
-        if match:
-            return json.loads(match.group(1))
+        try:
+            start = content.index('[', content.index('const CHORD_SONGS'))
+            end = content.rindex('];')
+        except ValueError:
+            return []
+        return json.loads(content[start:end + 1])
     except Exception as e:
         print(f"Warning: could not load existing {OUTPUT_FILE}: {e}")
     return []
 
 
+@lru_cache(maxsize=4096)
 def normalize_title(title):
     """Normalize a song title for comparison (lowercase, strip whitespace/punctuation)."""
     return re.sub(r'[^a-z0-9]', '', title.lower())
 
 
+def trigrams(s):
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+def index_titles(titles):
+    """Map each trigram to the normalized titles containing it.
+    Titles too short to have a trigram are filed under ''."""
+    index = {}
+    for t in titles:
+        for gram in trigrams(t) or ('',):
+            index.setdefault(gram, set()).add(t)
+    return index
+
+
+def title_candidates(nt, existing_titles, title_index):
+    """Existing titles that could contain nt or be contained in it.
+    If one title contains the other they share a trigram, so only titles that
+    share one with nt (plus the very short ones) need the substring test."""
+    if len(nt) < 3:
+        return existing_titles
+    candidates = set(title_index.get('', ()))
+    for gram in trigrams(nt):
+        candidates.update(title_index.get(gram, ()))
+    return candidates
+
+
+def title_exists(nt, existing_titles, title_index):
+    """Check a normalized title for an exact or substring match against existing titles."""
+    if nt in existing_titles:
+        return True
+    return any(nt in et or et in nt
+               for et in title_candidates(nt, existing_titles, title_index))
+
+
+def name_has_title(nt, existing_titles, title_index):
+    """Check a filename-derived title for an existing title it equals or contains,
+    e.g. "amazinggracechords" for "amazinggrace". Stricter than title_exists:
+    a short filename like "forever" may belong to a new song whose real title
+    only shares a word with an existing one."""
+    if nt in existing_titles:
+        return True
+    return any(et in nt for et in title_candidates(nt, existing_titles, title_index))
+
+
+def convert_chunk(filenames):
+    """Convert a batch of files to text with a single textutil process.
+    Returns a list of (text, error) pairs in input order; one of each pair is None.
+
+    textutil writes each output next to its input, so the files are symlinked
+    into a temp directory under numbered names (avoids "x.doc"/"x.docx" both
+    becoming "x.txt") and converted there in one invocation."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        links = []
+        for i, filename in enumerate(filenames):
+            link = os.path.join(tmpdir, f"{i}{os.path.splitext(filename)[1]}")
+            os.symlink(os.path.join(LYRICS_DIR, filename), link)
+            links.append(link)
+
+        try:
+            subprocess.run(
+                ['textutil', '-convert', 'txt'] + links,
+                capture_output=True, timeout=10 * len(links)
+            )
+        except Exception as e:
+            return [(None, f"{filename} ({e})") for filename in filenames]
+
+        results = []
+        for i, filename in enumerate(filenames):
+            try:
+                # A missing output means textutil failed on this file
+                txt_path = os.path.join(tmpdir, f"{i}.txt")
+                if not os.path.exists(txt_path):
+                    results.append((None, f"{filename} (conversion error)"))
+                    continue
+                with open(txt_path, 'rb') as f:
+                    results.append((f.read().decode('utf-8'), None))
+            except Exception as e:
+                results.append((None, f"{filename} ({e})"))
+        return results
+
+
+def load_cache():
+    """Load the per-file parse cache from the previous build. Returns {} if it
+    is missing, unreadable, or was written by a different version of build_chords.py."""
+    if not os.path.exists(CACHE_FILE):
+        return {}
+    try:
+        with open(CACHE_FILE, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        if (cache.get('script_mtime') == os.stat(__file__).st_mtime_ns
+                and isinstance(cache.get('files'), dict)):
+            return cache['files']
+    except Exception as e:
+        print(f"Warning: could not load {CACHE_FILE}: {e}")
+    return {}
+
+
+def save_cache(files):
+    with open(CACHE_FILE, 'w', encoding='utf-8') as f:
+        json.dump({'script_mtime': os.stat(__file__).st_mtime_ns, 'files': files}, f)
+
+
 def main():
     # Parse command-line flags
     force_all = '--force' in sys.argv
@@ -594,47 +770,104 @@ def main():
                     kept.append(s)
             existing_songs = kept
 
+    title_index = index_titles(existing_titles)
+
     new_songs = []
     skipped = []
     already_existed = 0
-
+    name_matched = 0
+
+    cache = load_cache()
+    new_cache = {}
+
+    # Skip textutil entirely for files whose name already maps to a known song;
+    # anything the filename doesn't match is still converted and checked by title.
+    # These are counted apart from already_existed: a name match may also be a
+    # lyrics-only twin (e.g. "Good Good Father.docx") that was never a chord song.
+    if existing_titles:
+        to_check = []
+        for filename in files:
+            tentative = normalize_title(clean_filename(filename))
+            if tentative and name_has_title(tentative, existing_titles, title_index):
+                name_matched += 1
+                if filename in cache:
+                    new_cache[filename] = cache[filename]
+            else:
+                to_check.append(filename)
+        files = to_check
+
+    # Reuse cached parses for files whose mtime and size are unchanged.
+    # results maps filename -> (song, skip_reason); song is None for non-chord files.
+    results = {}
+    stamps = {}
+    to_convert = []
+    reused = 0
     for filename in files:
-        filepath = os.path.join(LYRICS_DIR, filename)
         try:
-            result = subprocess.run(
-                ['textutil', '-convert', 'txt', '-stdout', filepath],
-                capture_output=True, text=True, timeout=10
-            )
-            if result.returncode != 0:
-                skipped.append(f"{filename} (conversion error)")
+            st = os.stat(os.path.join(LYRICS_DIR, filename))
+        except OSError as e:
+            # e.g. a dangling symlink, or a file removed since the listing
+            results[filename] = (None, f"{filename} ({e})")
+            continue
+        stamp = [st.st_mtime_ns, st.st_size]
+        entry = cache.get(filename)
+        if isinstance(entry, dict) and entry.get('stamp') == stamp and 'song' in entry:
+            song = entry['song']
+            results[filename] = (song, None if song else f"{filename} (not a chord file)")
+            new_cache[filename] = entry
+            reused += 1
+        else:
+            stamps[filename] = stamp
+            to_convert.append(filename)
+
+    if reused:
+        print(f"  {reused} unchanged files reused from cache")
+
+    # textutil runs as a separate process, so threads overlap the conversions;
+    # each thread converts a whole chunk per textutil launch.
+    # ex.map yields in file order; parsing stays on the main thread.
+    chunks = [to_convert[i:i + CHUNK_SIZE] for i in range(0, len(to_convert), CHUNK_SIZE)]
+    with ThreadPoolExecutor(max_workers=(os.cpu_count() or 1) * 2) as ex:
+        converted = (pair for chunk_results in ex.map(convert_chunk, chunks) for pair in chunk_results)
+        for filename, (text, error) in zip(to_convert, converted):
+            if error:
+                results[filename] = (None, error)
                 continue
+            try:
+                song = parse_chord_file(text, filename)
+            except Exception as e:
+                results[filename] = (None, f"{filename} ({e})")
+                continue
+            # Conversion and parse errors are not cached so they are retried next run
+            new_cache[filename] = {'stamp': stamps[filename], 'song': song}
+            results[filename] = (song, None if song else f"{filename} (not a chord file)")
 
-            song = parse_chord_file(result.stdout, filename)
-            if song:
-                nt = normalize_title(song['title'])
-                # Check for exact or substring match against existing titles
-                match_found = nt in existing_titles or any(
-                    nt in et or et in nt for et in existing_titles
-                )
-                if match_found:
-                    already_existed += 1
-                else:
-                    new_songs.append(song)
+    save_cache(new_cache)
+
+    for filename in files:
+        song, skip_reason = results[filename]
+        if song:
+            # Check for exact or substring match against existing titles
+            if title_exists(normalize_title(song['title']), existing_titles, title_index):
+                already_existed += 1
             else:
-                skipped.append(f"{filename} (not a chord file)")
-        except Exception as e:
-            skipped.append(f"{filename} ({e})")
+                new_songs.append(song)
+        else:
+            skipped.append(skip_reason)
 
     # Merge: existing songs (preserved) + newly discovered songs
     all_songs = existing_songs + new_songs
     all_songs.sort(key=lambda s: s['title'].lower())
 
-    output = f"// Generated by build_chords.py — manual edits are preserved on rebuild\n"
-    output += f"// Generated: {datetime.now().isoformat()}\n"
-    output += f"const CHORD_SONGS = {json.dumps(all_songs, indent=2)};\n"
-
+    # Stream the JSON straight into the file rather than building one big string.
+    # Keep indent=2: the file is hand-edited and diffed, and the viewer's
+    # Download button writes the same layout.
     with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-        f.write(output)
+        f.write(f"// Generated by build_chords.py — manual edits are preserved on rebuild\n")
+        f.write(f"// Generated: {datetime.now().isoformat()}\n")
+        f.write("const CHORD_SONGS = ")
+        json.dump(all_songs, f, indent=2)
+        f.write(";\n")
 
     print(f"\nGenerated {OUTPUT_FILE}")
     print(f"  {len(all_songs)} chord songs total")
@@ -646,6 +879,8 @@ def main():
             print(f"    + {s['title']}")
     if already_existed:
         print(f"  {already_existed} songs already existed (kept manual edits)")
+    if name_matched:
+        print(f"  {name_matched} files skipped: name matches an existing song")
     if skipped:
         print(f"  {len(skipped)} files skipped:")
         for s in skipped: